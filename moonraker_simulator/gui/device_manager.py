@@ -117,6 +117,7 @@ class DeviceManager:
             # Update printer state to printing
             simulator.printer_state['state'] = 'printing'
             simulator.printer_state['state_message'] = '正在打印'
+            simulator.mark_state_changed()
             return True
         except Exception as e:
             logger.error(f"Failed to start device {device_id}: {e}")
@@ -131,6 +132,7 @@ class DeviceManager:
             # Update printer state to paused
             simulator.printer_state['state'] = 'paused'
             simulator.printer_state['state_message'] = '打印已暂停'
+            simulator.mark_state_changed()
             return True
         except Exception as e:
             logger.error(f"Failed to pause device {device_id}: {e}")
@@ -145,6 +147,7 @@ class DeviceManager:
             # Update printer state to stopped
             simulator.printer_state['state'] = 'standby'
             simulator.printer_state['state_message'] = '打印机待机'
+            simulator.mark_state_changed()
             return True
         except Exception as e:
             logger.error(f"Failed to stop device {device_id}: {e}")
@@ -161,6 +161,7 @@ class DeviceWidget:
                 # Initialize progress
                 if 'print_progress' not in self.simulator.printer_state:
                     self.simulator.printer_state['print_progress'] = 0.0
+                self.simulator.mark_state_changed()
                 logger.info(f"Started device {self.device_id}")
         except Exception as e:
             logger.error(f"Failed to start device {self.device_id}: {e}")
@@ -171,6 +172,7 @@ class DeviceWidget:
             if self.simulator:
                 self.simulator.printer_state['state'] = 'paused'
                 self.simulator.printer_state['state_message'] = '打印已暂停'
+                self.simulator.mark_state_changed()
                 logger.info(f"Paused device {self.device_id}")
         except Exception as e:
             logger.error(f"Failed to pause device {self.device_id}: {e}")
@@ -185,6 +187,7 @@ class DeviceWidget:
                 self.simulator.printer_state['print_progress'] = 0.0
                 if 'print_file' in self.simulator.printer_state:
                     del self.simulator.printer_state['print_file']
+                self.simulator.mark_state_changed()
                 logger.info(f"Stopped device {self.device_id}")
         except Exception as e:
             logger.error(f"Failed to stop device {self.device_id}: {e}")
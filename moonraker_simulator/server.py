@@ -5,10 +5,15 @@ This module implements a basic Moonraker API server that simulates
 common endpoints and WebSocket connections using Tornado framework.
 """
 
+import asyncio
+import functools
 import json
 import logging
+import queue
+import socket
+import threading
 import time
-from typing import Dict, Any, Set
+from typing import Dict, Any, Callable, List, Tuple
 
 import tornado.ioloop
 import tornado.web
@@ -16,18 +21,194 @@ import tornado.websocket
 from tornado.httpserver import HTTPServer
 from zeroconf import ServiceInfo, Zeroconf, IPVersion
 
+try:
+    import uvloop
+except ImportError:
+    # uvloop is optional (and unavailable on Windows)
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# JSON helpers: encode straight to UTF-8 bytes so Tornado does not have to
+# re-encode payloads. Prefer orjson, then ujson, then the stdlib json module.
+if orjson is not None:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+    _JSONDecodeError = orjson.JSONDecodeError
+elif ujson is not None:
+    def _json_dumps(obj: Any) -> bytes:
+        """Encode an object as JSON bytes."""
+        return ujson.dumps(obj).encode("utf-8")
+    
+    _json_loads = ujson.loads
+    # Older ujson releases raise plain ValueError
+    _JSONDecodeError = getattr(ujson, "JSONDecodeError", ValueError)
+else:
+    def _json_dumps(obj: Any) -> bytes:
+        """Encode an object as JSON bytes."""
+        return json.dumps(obj).encode("utf-8")
+    
+    _json_loads = json.loads
+    _JSONDecodeError = json.JSONDecodeError
+
+
+# G-code scripts waiting to be logged by the background drain thread
+_gcode_log_queue: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+_gcode_log_thread = None
+_gcode_log_lock = threading.Lock()
+GCODE_LOG_BATCH_SIZE = 256
+
+
+def _drain_gcode_log():
+    """Log queued G-code scripts in batches, off the request path."""
+    while True:
+        batch = [_gcode_log_queue.get()]
+        try:
+            while len(batch) < GCODE_LOG_BATCH_SIZE:
+                batch.append(_gcode_log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        logger.info("\n".join(f"Received G-code: {script}" for script in batch))
+
+
+def _start_gcode_logger():
+    """Start the G-code log drain thread once per process."""
+    global _gcode_log_thread
+    with _gcode_log_lock:
+        if _gcode_log_thread is None:
+            _gcode_log_thread = threading.Thread(
+                target=_drain_gcode_log, name="gcode-log", daemon=True)
+            _gcode_log_thread.start()
+
+
+# IOLoop thread shared by all simulators started with run_in_thread=True
+_shared_ioloop = None
+_shared_ioloop_lock = threading.Lock()
+
+# Zeroconf instance shared by all simulators, closed with its last user
+_shared_zeroconf = None
+_shared_zeroconf_users = 0
+_shared_zeroconf_lock = threading.Lock()
+
+
+def _run_shared_ioloop(ready: threading.Event):
+    """Run the shared IOLoop in a background thread."""
+    global _shared_ioloop
+    try:
+        _shared_ioloop = tornado.ioloop.IOLoop()
+        _shared_ioloop.make_current()
+        ready.set()
+        logger.info("Shared IOLoop started")
+        _shared_ioloop.start()
+    except Exception as e:
+        logger.error(f"Error in shared IOLoop: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+    finally:
+        ready.set()
+
+
+def _get_shared_ioloop() -> tornado.ioloop.IOLoop:
+    """Return the shared background IOLoop, starting its thread on first use."""
+    with _shared_ioloop_lock:
+        if _shared_ioloop is None:
+            ready = threading.Event()
+            thread = threading.Thread(
+                target=_run_shared_ioloop, args=(ready,), name="moonraker-ioloop", daemon=True)
+            thread.start()
+            ready.wait()
+        return _shared_ioloop
+
+
+def _acquire_zeroconf() -> Zeroconf:
+    """Return the shared Zeroconf instance, creating it on first use."""
+    global _shared_zeroconf, _shared_zeroconf_users
+    with _shared_zeroconf_lock:
+        if _shared_zeroconf is None:
+            # IPv4 only for better compatibility; this is critical for
+            # reliable service discovery
+            _shared_zeroconf = Zeroconf(ip_version=IPVersion.V4Only)
+        _shared_zeroconf_users += 1
+        return _shared_zeroconf
+
+
+def _release_zeroconf():
+    """Drop a reference to the shared Zeroconf instance, closing it when unused."""
+    global _shared_zeroconf, _shared_zeroconf_users
+    with _shared_zeroconf_lock:
+        _shared_zeroconf_users -= 1
+        if _shared_zeroconf_users <= 0 and _shared_zeroconf is not None:
+            _shared_zeroconf.close()
+            _shared_zeroconf = None
+            _shared_zeroconf_users = 0
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_hostname() -> str:
+    """Get the machine hostname, looked up once per process."""
+    return socket.gethostname()
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_local_ip() -> str:
+    """
+    Get the local IP address, looked up once per process.
+    
+    Raises on failure, so only a successful lookup is cached.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.connect(("8.8.8.8", 80))
+        return s.getsockname()[0]
+
+
+def _install_uvloop():
+    """Use uvloop as the asyncio event loop if it is installed."""
+    if uvloop is not None and not isinstance(
+            asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy):
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
 class BaseAPIHandler(tornado.web.RequestHandler):
     """Base handler for API endpoints."""
     
+    CORS_HEADERS = (
+        ("Access-Control-Allow-Origin", "*"),
+        ("Access-Control-Allow-Headers", "Content-Type"),
+        ("Access-Control-Allow-Methods", "GET, POST, OPTIONS"),
+    )
+    
     def set_default_headers(self):
         """Set CORS headers."""
-        self.set_header("Access-Control-Allow-Origin", "*")
-        self.set_header("Access-Control-Allow-Headers", "Content-Type")
-        self.set_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        # The values are constant, so skip set_header()'s per-call validation
+        self._headers.update(self.CORS_HEADERS)
+    
+    # Largest request body that will be parsed as JSON
+    MAX_JSON_BODY_SIZE = 1024 * 1024
+    
+    def parse_json_body(self) -> Dict[str, Any]:
+        """Parse the request body as a JSON object; {} if empty or invalid."""
+        body = self.request.body
+        if not body:
+            return {}
+        if len(body) > self.MAX_JSON_BODY_SIZE:
+            raise tornado.web.HTTPError(413, reason="Request body too large")
+        try:
+            data = _json_loads(body)
+        except (_JSONDecodeError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
     
     def options(self):
         """Handle OPTIONS request for CORS."""
@@ -37,7 +218,13 @@ class BaseAPIHandler(tornado.web.RequestHandler):
     def write_json(self, data: Dict[str, Any]):
         """Write JSON response."""
         self.set_header("Content-Type", "application/json")
-        self.write(json.dumps(data))
+        self.write(_json_dumps(data))
+        self.finish()
+    
+    def _ok(self):
+        """Write the precomputed {"result": "ok"} response."""
+        self.set_header("Content-Type", "application/json")
+        self.write(b'{"result": "ok"}')
         self.finish()
     
     def write_error(self, status_code, **kwargs):
@@ -51,22 +238,20 @@ class BaseAPIHandler(tornado.web.RequestHandler):
         }
         if "exc_info" in kwargs:
             exception = kwargs["exc_info"][1]
-            logger.error(f"Handler error: {exception}", exc_info=kwargs["exc_info"])
+            if isinstance(exception, tornado.web.HTTPError) and exception.status_code < 500:
+                # Client errors (e.g. an oversized body) aren't server faults
+                logger.warning(f"Client error: {exception}")
+            else:
+                logger.error(f"Handler error: {exception}", exc_info=kwargs["exc_info"])
             error_info["error"]["message"] = str(exception)
         
         self.set_status(status_code)
-        self.write(json.dumps(error_info))
+        self.write(_json_dumps(error_info))
         self.finish()
     
-    @property
-    def simulator(self):
-        """Get simulator instance."""
-        try:
-            # Get from application attribute (set directly)
-            return self.application.simulator
-        except AttributeError:
-            logger.error("Simulator not found in application")
-            raise tornado.web.HTTPError(500, reason="Server configuration error")
+    def initialize(self, simulator: "MoonrakerSimulator"):
+        """Store the simulator passed in through the route's kwargs."""
+        self.simulator = simulator
 
 
 class ServerInfoHandler(BaseAPIHandler):
@@ -82,7 +267,7 @@ class ServerInfoHandler(BaseAPIHandler):
                 "failed_components": [],
                 "registered_directories": ["config", "logs", "gcodes"],
                 "warnings": [],
-                "websocket_count": len(self.simulator.websocket_clients),
+                "websocket_count": self.simulator.websocket_count,
                 "moonraker_version": "0.1.0"
             }
         })
@@ -109,34 +294,78 @@ class PrinterInfoHandler(BaseAPIHandler):
         })
 
 
+def _extruder_query_status(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the query status for the extruder / temperature sensor."""
+    extruder = state["temperature"]["extruder"]
+    return {
+        "temperature": extruder["actual"],
+        "target": extruder["target"],
+        "power": 0.0
+    }
+
+
+def _bed_query_status(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the query status for the heater bed."""
+    heater_bed = state["temperature"]["heater_bed"]
+    return {
+        "temperature": heater_bed["actual"],
+        "target": heater_bed["target"],
+        "power": 0.0
+    }
+
+
+def _print_stats_query_status(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the query status for print stats."""
+    return state["print_stats"]
+
+
 class PrinterObjectsQueryHandler(BaseAPIHandler):
     """Handle /printer/objects/query endpoint."""
     
+    DEFAULT_OBJECTS = b"temperature_sensor,heater_bed,extruder"
+    
+    # Object name -> status builder, looked up once per requested object
+    OBJECT_BUILDERS = {
+        "temperature_sensor": _extruder_query_status,
+        "extruder": _extruder_query_status,
+        "heater_bed": _bed_query_status,
+        "print_stats": _print_stats_query_status,
+    }
+    
+    @classmethod
+    @functools.lru_cache(maxsize=64)
+    def _parse_objects(cls, objects: bytes) -> Tuple[Tuple[str, Callable], ...]:
+        """Split a raw objects argument into (name, builder) pairs."""
+        parsed = []
+        for obj in objects.split(b","):
+            name = obj.strip().decode("utf-8", "replace")
+            builder = cls.OBJECT_BUILDERS.get(name)
+            if builder is not None:
+                parsed.append((name, builder))
+        return tuple(parsed)
+    
     def get(self):
         """Query printer objects."""
-        objects_str = self.get_argument("objects", "temperature_sensor,heater_bed,extruder")
-        obj_list = [obj.strip() for obj in objects_str.split(",")]
+        # Use the raw bytes argument so repeated queries hit the parse cache
+        values = self.request.arguments.get("objects")
+        objects = values[-1] if values else self.DEFAULT_OBJECTS
         
-        result = {}
-        state = self.simulator.printer_state
-        
-        for obj in obj_list:
-            if obj == "temperature_sensor" or obj == "extruder":
-                result[obj] = {
-                    "temperature": state["temperature"]["extruder"]["actual"],
-                    "target": state["temperature"]["extruder"]["target"],
-                    "power": 0.0
-                }
-            elif obj == "heater_bed":
-                result[obj] = {
-                    "temperature": state["temperature"]["heater_bed"]["actual"],
-                    "target": state["temperature"]["heater_bed"]["target"],
-                    "power": 0.0
-                }
-            elif obj == "print_stats":
-                result[obj] = state["print_stats"]
+        # Serialized responses are reused until the printer state changes
+        simulator = self.simulator
+        cache = simulator.query_response_cache
+        key = (simulator.state_version, objects)
+        body = cache.get(key)
+        if body is None:
+            state = simulator.printer_state
+            result = {name: builder(state) for name, builder in self._parse_objects(objects)}
+            body = _json_dumps({"result": {"status": result}})
+            if len(cache) >= simulator.QUERY_CACHE_SIZE:
+                cache.clear()
+            cache[key] = body
         
-        self.write_json({"result": {"status": result}})
+        self.set_header("Content-Type", "application/json")
+        self.write(body)
+        self.finish()
 
 
 class PrinterObjectsListHandler(BaseAPIHandler):
@@ -183,7 +412,7 @@ class ServerRestartHandler(BaseAPIHandler):
     
     def post(self):
         """Simulate server restart."""
-        self.write_json({"result": "ok"})
+        self._ok()
 
 
 class PrintStartHandler(BaseAPIHandler):
@@ -191,17 +420,14 @@ class PrintStartHandler(BaseAPIHandler):
     
     def post(self):
         """Start a print job."""
-        try:
-            data = json.loads(self.request.body) if self.request.body else {}
-            filename = data.get("filename", "")
-        except (json.JSONDecodeError, ValueError):
-            filename = ""
+        filename = self.parse_json_body().get("filename", "")
         
         simulator = self.simulator
         simulator.printer_state["state"] = "printing"
         simulator.printer_state["state_message"] = f"Printing {filename}"
         simulator.printer_state["print_stats"]["filename"] = filename
         simulator.printer_state["print_stats"]["state"] = "printing"
+        simulator.mark_state_changed()
         
         # Broadcast state change to WebSocket clients
         simulator.broadcast_status_update({
@@ -209,7 +435,7 @@ class PrintStartHandler(BaseAPIHandler):
             "printer.state_message": simulator.printer_state["state_message"]
         })
         
-        self.write_json({"result": "ok"})
+        self._ok()
 
 
 class PrintCancelHandler(BaseAPIHandler):
@@ -221,6 +447,7 @@ class PrintCancelHandler(BaseAPIHandler):
         simulator.printer_state["state"] = "standby"
         simulator.printer_state["state_message"] = "Print cancelled"
         simulator.printer_state["print_stats"]["state"] = "standby"
+        simulator.mark_state_changed()
         
         # Broadcast state change to WebSocket clients
         simulator.broadcast_status_update({
@@ -228,7 +455,7 @@ class PrintCancelHandler(BaseAPIHandler):
             "printer.state_message": simulator.printer_state["state_message"]
         })
         
-        self.write_json({"result": "ok"})
+        self._ok()
 
 
 class GcodeScriptHandler(BaseAPIHandler):
@@ -236,19 +463,31 @@ class GcodeScriptHandler(BaseAPIHandler):
     
     def post(self):
         """Execute G-code script."""
-        try:
-            data = json.loads(self.request.body) if self.request.body else {}
-            script = data.get("script", "")
-        except (json.JSONDecodeError, ValueError):
-            script = ""
+        script = self.parse_json_body().get("script", "")
         
-        logger.info(f"Received G-code: {script}")
-        self.write_json({"result": "ok"})
+        _gcode_log_queue.put_nowait(script)
+        self._ok()
 
 
 class MoonrakerWebSocketHandler(tornado.websocket.WebSocketHandler):
     """WebSocket handler for Moonraker API."""
     
+    # Maximum number of pending broadcast messages per client
+    SEND_QUEUE_SIZE = 32
+    
+    # Tombstone flag; cleared once the client is registered with the simulator
+    _dead = True
+    
+    # Connection confirmation frame, split around the connection id
+    _CONNECT_PREFIX = b'{"jsonrpc":"2.0","method":"connected","params":{"connection_id":'
+    _CONNECT_SUFFIX = b'}}'
+    
+    # JSON-RPC method -> handler method name; handlers take (params, msg_id)
+    _METHODS = {
+        "printer.objects.subscribe": "_handle_subscribe",
+        "server.info": "_handle_server_info",
+    }
+    
     def set_default_headers(self):
         """Set CORS headers."""
         self.set_header("Access-Control-Allow-Origin", "*")
@@ -260,32 +499,44 @@ class MoonrakerWebSocketHandler(tornado.websocket.WebSocketHandler):
     def open(self):
         """Handle WebSocket connection."""
         logger.info("Client connected via WebSocket")
-        self.simulator.websocket_clients.add(self)
+        # Broadcasts go through a per-client queue drained by a relay task,
+        # so a slow client cannot hold up delivery to the others
+        self._send_queue = asyncio.Queue(maxsize=self.SEND_QUEUE_SIZE)
+        self._relay_task = asyncio.create_task(self._relay())
+        self.simulator.add_websocket_client(self)
         
         # Send connection confirmation
-        self.write_message(json.dumps({
-            "jsonrpc": "2.0",
-            "method": "connected",
-            "params": {"connection_id": id(self)}
-        }))
+        self.write_message(
+            self._CONNECT_PREFIX + str(id(self)).encode() + self._CONNECT_SUFFIX)
     
     def on_message(self, message):
         """Handle incoming WebSocket message."""
         try:
-            data = json.loads(message)
+            data = _json_loads(message)
+        except _JSONDecodeError:
+            logger.error(f"Invalid JSON message: {message}")
+            return
+        
+        # A JSON-RPC batch is a list of calls; each is answered separately
+        if isinstance(data, list):
+            for call in data:
+                self._dispatch(call)
+        else:
+            self._dispatch(data)
+    
+    def _dispatch(self, data: Dict[str, Any]):
+        """Dispatch a single JSON-RPC call to its handler."""
+        try:
             method = data.get("method", "")
             params = data.get("params", {})
             msg_id = data.get("id")
             
-            if method == "printer.objects.subscribe":
-                self._handle_subscribe(params, msg_id)
-            elif method == "server.info":
-                self._handle_server_info(msg_id)
+            handler_name = self._METHODS.get(method)
+            if handler_name is not None:
+                getattr(self, handler_name)(params, msg_id)
             else:
                 logger.warning(f"Unknown method: {method}")
                 
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON message: {message}")
         except Exception as e:
             logger.error(f"Error handling message: {e}")
     
@@ -321,9 +572,9 @@ class MoonrakerWebSocketHandler(tornado.websocket.WebSocketHandler):
         if msg_id is not None:
             response["id"] = msg_id
         
-        self.write_message(json.dumps(response))
+        self.write_message(_json_dumps(response))
     
-    def _handle_server_info(self, msg_id: Any):
+    def _handle_server_info(self, params: Dict, msg_id: Any):
         """Handle server info request."""
         response = {
             "jsonrpc": "2.0",
@@ -337,31 +588,74 @@ class MoonrakerWebSocketHandler(tornado.websocket.WebSocketHandler):
         if msg_id is not None:
             response["id"] = msg_id
         
-        self.write_message(json.dumps(response))
+        self.write_message(_json_dumps(response))
+    
+    def queue_message(self, message: bytes):
+        """Queue a message for delivery, dropping the oldest one if full."""
+        try:
+            self._send_queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Status updates are snapshots, so stale frames can be dropped
+            self._send_queue.get_nowait()
+            self._send_queue.put_nowait(message)
+    
+    async def _relay(self):
+        """Deliver queued messages to the client one at a time."""
+        while True:
+            message = await self._send_queue.get()
+            try:
+                await self.write_message(message)
+            except tornado.websocket.WebSocketClosedError:
+                break
+            except Exception as e:
+                logger.warning(f"Failed to send message to client: {e}")
+                break
     
     def on_close(self):
         """Handle WebSocket disconnection."""
         logger.info("Client disconnected")
-        self.simulator.websocket_clients.discard(self)
+        self.simulator.remove_websocket_client(self)
+        relay_task = getattr(self, "_relay_task", None)
+        if relay_task is not None:
+            relay_task.cancel()
     
-    @property
-    def simulator(self):
-        """Get simulator instance."""
-        return self.application.simulator
+    def initialize(self, simulator: "MoonrakerSimulator"):
+        """Store the simulator passed in through the route's kwargs."""
+        self.simulator = simulator
 
 
 class MoonrakerSimulator:
     """Minimal Moonraker API server simulator."""
     
+    # Closed clients tolerated in websocket_clients before it is compacted
+    DEAD_CLIENT_THRESHOLD = 16
+    
+    # Cached /printer/objects/query responses kept before the cache is reset
+    QUERY_CACHE_SIZE = 32
+    
+    # notify_status_update envelope, split around the params
+    _NOTIFY_PREFIX = b'{"jsonrpc":"2.0","method":"notify_status_update","params":'
+    _NOTIFY_SUFFIX = b'}'
+    
     def __init__(self, host: str = "0.0.0.0", port: int = 7125):
         self.host = host
         self.port = port
         self.zeroconf = None
         self.service_info = None
-        self.websocket_clients: Set[MoonrakerWebSocketHandler] = set()
+        # Closed clients are tombstoned and compacted in batches
+        self.websocket_clients: List[MoonrakerWebSocketHandler] = []
+        self._dead_client_count = 0
         self.http_server = None
-        self._thread = None
+        # Shared background IOLoop, set when started with run_in_thread=True
         self._ioloop = None
+        # Set once the HTTP server is listening on the shared IOLoop
+        self._ready = threading.Event()
+        _start_gcode_logger()
+        
+        # Bumped via mark_state_changed() whenever printer_state is modified;
+        # keys the /printer/objects/query response cache
+        self.state_version = 0
+        self.query_response_cache: Dict[Tuple[int, bytes], bytes] = {}
         
         # Simulated printer state
         self.printer_state = {
@@ -381,44 +675,54 @@ class MoonrakerSimulator:
         }
         
         # Setup Tornado application
-        # Store simulator reference directly on application
-        self.app = tornado.web.Application(
-            [
-                (r"/server/info", ServerInfoHandler),
-                (r"/printer/info", PrinterInfoHandler),
-                (r"/printer/objects/query", PrinterObjectsQueryHandler),
-                (r"/printer/objects/list", PrinterObjectsListHandler),
-                (r"/server/files/list", FilesListHandler),
-                (r"/server/restart", ServerRestartHandler),
-                (r"/printer/print/start", PrintStartHandler),
-                (r"/printer/print/cancel", PrintCancelHandler),
-                (r"/printer/gcode/script", GcodeScriptHandler),
-                (r"/websocket", MoonrakerWebSocketHandler),
-            ],
-            simulator=self
-        )
-        # Also store as attribute for direct access
-        self.app.simulator = self
+        # Every handler receives this simulator through initialize()
+        handler_kwargs = {"simulator": self}
+        self.app = tornado.web.Application([
+            (r"/server/info", ServerInfoHandler, handler_kwargs),
+            (r"/printer/info", PrinterInfoHandler, handler_kwargs),
+            (r"/printer/objects/query", PrinterObjectsQueryHandler, handler_kwargs),
+            (r"/printer/objects/list", PrinterObjectsListHandler, handler_kwargs),
+            (r"/server/files/list", FilesListHandler, handler_kwargs),
+            (r"/server/restart", ServerRestartHandler, handler_kwargs),
+            (r"/printer/print/start", PrintStartHandler, handler_kwargs),
+            (r"/printer/print/cancel", PrintCancelHandler, handler_kwargs),
+            (r"/printer/gcode/script", GcodeScriptHandler, handler_kwargs),
+            (r"/websocket", MoonrakerWebSocketHandler, handler_kwargs),
+        ])
+    
+    def mark_state_changed(self):
+        """Record a printer_state change, invalidating cached responses."""
+        self.state_version += 1
+    
+    @property
+    def websocket_count(self) -> int:
+        """Number of currently connected WebSocket clients."""
+        return len(self.websocket_clients) - self._dead_client_count
+    
+    def add_websocket_client(self, client: MoonrakerWebSocketHandler):
+        """Register a connected WebSocket client."""
+        client._dead = False
+        self.websocket_clients.append(client)
+    
+    def remove_websocket_client(self, client: MoonrakerWebSocketHandler):
+        """Mark a WebSocket client as closed."""
+        if client._dead:
+            return
+        client._dead = True
+        self._dead_client_count += 1
+        if self._dead_client_count > self.DEAD_CLIENT_THRESHOLD:
+            self.websocket_clients[:] = [c for c in self.websocket_clients if not c._dead]
+            self._dead_client_count = 0
     
     def broadcast_status_update(self, data: Dict[str, Any]):
         """Broadcast status update to all WebSocket clients."""
-        message = json.dumps({
-            "jsonrpc": "2.0",
-            "method": "notify_status_update",
-            "params": data
-        })
+        # Only the params vary; splice them into the pre-encoded envelope
+        message = self._NOTIFY_PREFIX + _json_dumps(data) + self._NOTIFY_SUFFIX
         
-        disconnected = []
+        # Enqueue only; each client's relay task performs the actual write
         for client in self.websocket_clients:
-            try:
-                client.write_message(message)
-            except Exception as e:
-                logger.warning(f"Failed to send message to client: {e}")
-                disconnected.append(client)
-        
-        # Remove disconnected clients
-        for client in disconnected:
-            self.websocket_clients.discard(client)
+            if not client._dead:
+                client.queue_message(message)
     
     def _register_zeroconf(self):
         """Register service with Zeroconf for service discovery."""
@@ -427,35 +731,33 @@ class MoonrakerSimulator:
             return
         
         try:
-            import socket
-            
             service_type = "_moonraker._tcp.local."
             
             # Get local IP address for service registration
             local_ip = self._get_local_ip()
             
-            # Generate a unique service name (use hostname if available)
-            # Format: hostname._moonraker._tcp.local. (replace spaces with hyphens)
-            # For multiple instances, add port to make it unique
             try:
-                hostname = socket.gethostname()
+                hostname = _cached_hostname()
+            except Exception:
+                hostname = None
+            
+            if hostname is not None:
                 # Clean hostname: replace spaces and special chars with hyphens
                 clean_hostname = hostname.replace(' ', '-').replace('_', '-')
-                # Add port to service name for uniqueness when running multiple instances
+                # Generate a unique service name
+                # Format: hostname-port._moonraker._tcp.local.
+                # Port is added for uniqueness when running multiple instances
                 service_name = f"{clean_hostname}-{self.port}.{service_type}"
-            except Exception:
+                # Server hostname for mDNS (format: hostname.local.)
+                server_hostname = f"{clean_hostname}.local."
+            else:
                 service_name = f"Moonraker-Simulator-{self.port}.{service_type}"
+                server_hostname = f"{local_ip.replace('.', '-')}.local."
+                hostname = server_hostname
             
             # Convert IP string to bytes for ServiceInfo
             ip_bytes = socket.inet_aton(local_ip)
             
-            # Get server hostname for mDNS (format: hostname.local.)
-            try:
-                clean_hostname = socket.gethostname().replace(' ', '-').replace('_', '-')
-                server_hostname = f"{clean_hostname}.local."
-            except Exception:
-                server_hostname = f"{local_ip.replace('.', '-')}.local."
-            
             # Create ServiceInfo with proper format (matching reference implementation)
             self.service_info = ServiceInfo(
                 type_=service_type,
@@ -464,17 +766,20 @@ class MoonrakerSimulator:
                 port=self.port,
                 properties={
                     b"version": b"0.1.0",
-                    b"hostname": socket.gethostname().encode('utf-8')
+                    b"hostname": hostname.encode('utf-8')
                 },
                 server=server_hostname
             )
             
-            # Create Zeroconf instance with IPv4 only for better compatibility
-            # This is critical for reliable service discovery
-            self.zeroconf = Zeroconf(ip_version=IPVersion.V4Only)
-            
-            # Register service - this should be done after server is ready
-            self.zeroconf.register_service(self.service_info)
+            # All simulators in the process share one Zeroconf instance
+            zeroconf = _acquire_zeroconf()
+            try:
+                # Register service - this should be done after server is ready
+                zeroconf.register_service(self.service_info)
+            except Exception:
+                _release_zeroconf()
+                raise
+            self.zeroconf = zeroconf
             
             logger.info("=" * 60)
             logger.info("📡 mDNS Service Registered")
@@ -494,14 +799,10 @@ class MoonrakerSimulator:
     
     def _get_local_ip(self):
         """Get local IP address."""
-        import socket
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip
+            return _cached_local_ip()
         except Exception:
+            # Not cached: the next registration probes again
             return "127.0.0.1"
     
     def _unregister_zeroconf(self):
@@ -509,10 +810,12 @@ class MoonrakerSimulator:
         if self.zeroconf and self.service_info:
             try:
                 self.zeroconf.unregister_service(self.service_info)
-                self.zeroconf.close()
                 logger.info("Unregistered Zeroconf service")
             except Exception as e:
                 logger.warning(f"Failed to unregister Zeroconf service: {e}")
+            finally:
+                self.zeroconf = None
+                _release_zeroconf()
     
     def start(self, run_in_thread: bool = False):
         """
@@ -523,33 +826,18 @@ class MoonrakerSimulator:
                           If False, run in the current thread (blocking).
         """
         logger.info(f"Starting Moonraker Simulator on {self.host}:{self.port}")
+        # Must happen before any IOLoop (and its asyncio loop) is created
+        _install_uvloop()
         
         if run_in_thread:
-            # Run in a separate thread
-            # Create IOLoop first, then start HTTP server in that IOLoop
-            import threading
-            import time
-            import socket
+            # Run on the IOLoop thread shared by all threaded simulators
+            self._ready.clear()
+            self._ioloop = _get_shared_ioloop()
+            self._ioloop.add_callback(self._start_http_server)
             
-            self._thread = threading.Thread(target=self._run_ioloop, daemon=True)
-            self._thread.start()
-            
-            # Wait for server to be ready by checking if port is listening
-            max_retries = 10
-            retry_count = 0
-            while retry_count < max_retries:
-                time.sleep(0.1)
-                try:
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    sock.settimeout(0.1)
-                    result = sock.connect_ex((self.host if self.host != "0.0.0.0" else "127.0.0.1", self.port))
-                    sock.close()
-                    if result == 0:
-                        # Port is listening, server is ready
-                        break
-                except Exception:
-                    pass
-                retry_count += 1
+            # Wait for the IOLoop thread to signal that the server is listening
+            if not self._ready.wait(timeout=5):
+                logger.warning(f"Timed out waiting for HTTP server on port {self.port}")
             
             # Register Zeroconf after server is ready
             self._register_zeroconf()
@@ -569,53 +857,48 @@ class MoonrakerSimulator:
             finally:
                 self.stop()
     
-    def _run_ioloop(self):
-        """Run the IOLoop in a separate thread."""
+    def _start_http_server(self):
+        """Start the HTTP server; runs on the shared IOLoop thread."""
         try:
-            # Create a new IOLoop for this thread
-            self._ioloop = tornado.ioloop.IOLoop()
-            self._ioloop.make_current()
-            
-            # Start HTTP server in this IOLoop's thread
-            def start_server():
-                self.http_server = HTTPServer(self.app)
-                self.http_server.listen(self.port, address=self.host)
-                logger.info(f"HTTP server listening on {self.host}:{self.port}")
-            
-            # Schedule server start in the IOLoop
-            self._ioloop.add_callback(start_server)
-            
-            logger.info(f"IOLoop started for port {self.port}")
-            self._ioloop.start()
-        except Exception as e:
-            logger.error(f"Error in IOLoop for port {self.port}: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            self.http_server = HTTPServer(self.app)
+            self.http_server.listen(self.port, address=self.host)
+            logger.info(f"HTTP server listening on {self.host}:{self.port}")
         finally:
-            self.stop()
+            # Wake up start() even if listen() failed
+            self._ready.set()
     
     def stop(self):
         """Stop the simulator server."""
         logger.info(f"Stopping Moonraker Simulator on port {self.port}...")
         self._unregister_zeroconf()
         
-        # Stop IOLoop if running in thread
         if self._ioloop:
-            try:
-                self._ioloop.stop()
-            except Exception as e:
-                logger.warning(f"Error stopping IOLoop: {e}")
-        
+            # The shared IOLoop keeps serving other simulators, so only this
+            # server is shut down, on the IOLoop's own thread
+            self._ioloop.add_callback(self._shutdown)
+        else:
+            self._shutdown()
+    
+    def _shutdown(self):
+        """Stop the HTTP server and close all WebSocket connections."""
         if self.http_server:
             self.http_server.stop()
+            self.http_server = None
         
-        # Close all WebSocket connections
-        for client in list(self.websocket_clients):
-            try:
-                client.close()
-            except Exception:
-                pass
-        self.websocket_clients.clear()
+        # Close all WebSocket connections. The list is detached up front and
+        # each client tombstoned, so on_close callbacks leave it untouched.
+        clients = self.websocket_clients
+        if clients:
+            self.websocket_clients = []
+            self._dead_client_count = 0
+            for client in clients:
+                if client._dead:
+                    continue
+                client._dead = True
+                try:
+                    client.close()
+                except Exception:
+                    pass
         
         logger.info(f"Moonraker Simulator stopped on port {self.port}")
 
@@ -706,10 +989,13 @@ Examples:
         
         logger.info(f"All {len(simulators)} simulators are running. Press Ctrl+C to stop.")
         try:
-            # Keep main thread alive
+            # Keep main thread alive; signal.pause() sleeps until a signal
+            # arrives, Windows has no pause() so fall back to long sleeps
             while True:
-                import time
-                time.sleep(1)
+                if hasattr(signal, "pause"):
+                    signal.pause()
+                else:
+                    time.sleep(3600)
         except KeyboardInterrupt:
             signal_handler(None, None)
 
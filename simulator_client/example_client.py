@@ -6,16 +6,13 @@ This script provides a unified entry point to test all Moonraker Simulator featu
 - WebSocket connections
 - Zeroconf service discovery
 
-It imports and orchestrates tests from separate modules.
+It imports and orchestrates tests from separate modules. Each test module
+is imported only when its test is selected, so e.g. --rest-only doesn't pay
+for importing websocket-client or zeroconf.
 """
 
 import argparse
 
-# Import test modules
-from test_rest_api import test_rest_api
-from test_websocket import test_websocket
-from test_zeroconf import test_service_discovery
-
 
 def main():
     """Main function."""
@@ -41,6 +38,9 @@ Examples:
 
   # Test with custom discovery timeout
   python example_client.py --discovery-only --discovery-timeout 10
+
+  # Stop discovery as soon as 2 services are found
+  python example_client.py --discovery-only --discovery-expected 2
         """
     )
     
@@ -70,25 +70,35 @@ Examples:
         default=5,
         help="Service discovery timeout in seconds (default: 5)"
     )
+    parser.add_argument(
+        "--discovery-expected",
+        type=int,
+        default=None,
+        help="Stop service discovery once this many services are found"
+    )
     
     args = parser.parse_args()
     
     # Run tests based on arguments
     if args.discovery_only:
         # Only test service discovery
-        test_service_discovery(args.discovery_timeout)
+        from test_zeroconf import test_service_discovery
+        test_service_discovery(args.discovery_timeout, args.discovery_expected)
     else:
         # Run REST API test if not WebSocket-only
         if not args.ws_only:
+            from test_rest_api import test_rest_api
             test_rest_api(args.url)
         
         # Run WebSocket test if not REST-only
         if not args.rest_only:
+            from test_websocket import test_websocket
             test_websocket(args.url)
         
         # Also test service discovery if not restricted
         if not args.rest_only and not args.ws_only:
-            test_service_discovery(args.discovery_timeout)
+            from test_zeroconf import test_service_discovery
+            test_service_discovery(args.discovery_timeout, args.discovery_expected)
 
 
 if __name__ == "__main__":
@@ -6,79 +6,82 @@ This module provides functions to test Moonraker Simulator REST API endpoints.
 
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def test_rest_api(base_url: str = "http://localhost:7125"):
-    """Test REST API endpoints."""
-    print("=" * 50)
-    print("Testing REST API")
-    print("=" * 50)
-    
-    # Test server info
-    print("\n1. Getting server info...")
-    try:
-        response = requests.get(f"{base_url}/server/info")
-        print(f"Status: {response.status_code}")
-        if response.status_code == 200:
-            print(f"Response: {json.dumps(response.json(), indent=2)}")
-        else:
-            print(f"Error response: {response.text}")
-    except Exception as e:
-        print(f"Error: {e}")
-    
-    # Test printer info
-    print("\n2. Getting printer info...")
+# Parse response bodies with orjson when available
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# Shared keep-alive session so all probes reuse one pooled connection
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+
+# (connect timeout, read timeout) for every REST probe
+REQUEST_TIMEOUT = (1, 3)
+
+
+# Read-only probes, run concurrently: (title, method, path, request kwargs)
+READ_PROBES = [
+    ("Getting server info", "GET", "/server/info", {}),
+    ("Getting printer info", "GET", "/printer/info", {}),
+    ("Querying printer objects", "GET", "/printer/objects/query",
+     {"params": {"objects": "temperature_sensor,heater_bed,print_stats"}}),
+]
+
+# State-changing probes, run in order after the read-only ones
+PRINT_PROBES = [
+    ("Starting a print job", "POST", "/printer/print/start", {"json": {"filename": "test.gcode"}}),
+    ("Cancelling print job", "POST", "/printer/print/cancel", {}),
+]
+
+
+def _request(base_url: str, method: str, path: str, kwargs: dict):
+    """Send one probe request, returning the response or the raised exception."""
     try:
-        response = requests.get(f"{base_url}/printer/info")
-        print(f"Status: {response.status_code}")
-        if response.status_code == 200:
-            print(f"Response: {json.dumps(response.json(), indent=2)}")
-        else:
-            print(f"Error response: {response.text}")
+        return SESSION.request(method, f"{base_url}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
     except Exception as e:
-        print(f"Error: {e}")
-    
-    # Test printer objects query
-    print("\n3. Querying printer objects...")
+        return e
+
+
+def _print_result(index: int, title: str, result):
+    """Print the outcome of one probe."""
+    print(f"\n{index}. {title}...")
+    if isinstance(result, Exception):
+        print(f"Error: {result}")
+        return
     try:
-        response = requests.get(
-            f"{base_url}/printer/objects/query",
-            params={"objects": "temperature_sensor,heater_bed,print_stats"}
-        )
-        print(f"Status: {response.status_code}")
-        if response.status_code == 200:
-            print(f"Response: {json.dumps(response.json(), indent=2)}")
+        print(f"Status: {result.status_code}")
+        if result.status_code == 200:
+            print(f"Response: {json.dumps(_json_loads(result.content), indent=2)}")
         else:
-            print(f"Error response: {response.text}")
+            print(f"Error response: {result.text}")
     except Exception as e:
         print(f"Error: {e}")
+
+
+def test_rest_api(base_url: str = "http://localhost:7125"):
+    """Test REST API endpoints."""
+    print("=" * 50)
+    print("Testing REST API")
+    print("=" * 50)
     
-    # Test start print
-    print("\n4. Starting a print job...")
-    try:
-        response = requests.post(
-            f"{base_url}/printer/print/start",
-            json={"filename": "test.gcode"}
-        )
-        print(f"Status: {response.status_code}")
-        if response.status_code == 200:
-            print(f"Response: {json.dumps(response.json(), indent=2)}")
-        else:
-            print(f"Error response: {response.text}")
-    except Exception as e:
-        print(f"Error: {e}")
+    # Overlap the read-only requests; results are printed in probe order
+    with ThreadPoolExecutor(max_workers=len(READ_PROBES)) as executor:
+        futures = [
+            executor.submit(_request, base_url, method, path, kwargs)
+            for _, method, path, kwargs in READ_PROBES
+        ]
+        for index, (probe, future) in enumerate(zip(READ_PROBES, futures), 1):
+            _print_result(index, probe[0], future.result())
     
-    # Test cancel print
-    print("\n5. Cancelling print job...")
-    try:
-        response = requests.post(f"{base_url}/printer/print/cancel")
-        print(f"Status: {response.status_code}")
-        if response.status_code == 200:
-            print(f"Response: {json.dumps(response.json(), indent=2)}")
-        else:
-            print(f"Error response: {response.text}")
-    except Exception as e:
-        print(f"Error: {e}")
+    # Start must complete before cancel, so these stay sequential
+    for index, (title, method, path, kwargs) in enumerate(PRINT_PROBES, len(READ_PROBES) + 1):
+        _print_result(index, title, _request(base_url, method, path, kwargs))
 
 
 def main():
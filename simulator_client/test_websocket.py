@@ -4,45 +4,134 @@ WebSocket Test Module
 This module provides functions and classes to test Moonraker Simulator WebSocket connections.
 """
 
+import sys
 import websocket
 import threading
 import time
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Machine parsing/encoding goes through orjson when available;
+# json.dumps(indent=2) is kept for human-readable output only
+if orjson is not None:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+else:
+    def _json_dumps(obj) -> bytes:
+        """Encode an object as JSON bytes."""
+        return json.dumps(obj).encode("utf-8")
+    
+    _json_loads = json.loads
+
+# Pretty-print payloads only for an interactive terminal; when output is
+# piped or redirected, skip the re-serialization and print the dict as is
+PRETTY = sys.stdout.isatty()
+
+
+def _format_params(params):
+    """Format a message payload for printing."""
+    if not PRETTY:
+        return params
+    if orjson is not None:
+        return orjson.dumps(params, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(params, indent=2)
+
 
 class WebSocketClient:
     """WebSocket client for testing."""
     
+    # Constant head of every outgoing JSON-RPC message
+    _MESSAGE_PREFIX = b'{"jsonrpc":"2.0","method":'
+    
+    # Keepalive: ping every PING_INTERVAL seconds, drop the connection if
+    # no pong arrives within PING_TIMEOUT seconds
+    PING_INTERVAL = 25
+    PING_TIMEOUT = 10
+    
     def __init__(self, url: str):
         self.url = url.replace("http://", "ws://").replace("https://", "wss://") + "/websocket"
         self.ws = None
         self.connected = False
+        self._thread = None
+        self._opened = threading.Event()
+        self._closed = threading.Event()
+        self.last_pong = None
+        # Message ids still waiting for a reply (see expect_responses)
+        self._pending_ids = set()
+        self._pending_lock = threading.Lock()
+        self._responses_received = threading.Event()
+        # method -> handler(params, data)
+        self._handlers = {
+            "connected": self._on_connected,
+            "printer.objects.status": self._on_status,
+            "server.info": self._on_server_info,
+            "notify_status_update": self._on_notify,
+        }
     
-    def on_message(self, ws, message):
-        """Handle incoming WebSocket message."""
+    def on_message(self, ws, message: bytes):
+        """Handle incoming WebSocket message (raw UTF-8 bytes)."""
         try:
-            data = json.loads(message)
-            method = data.get("method", "")
-            params = data.get("params", {})
+            data = _json_loads(message)
+            handler = self._handlers.get(data.get("method", ""), self._on_unknown)
+            handler(data.get("params", {}), data)
             
-            if method == "connected":
-                print(f"\n✓ Server confirmed connection: {params}")
-            elif method == "printer.objects.status":
-                print(f"\n✓ Received status update:")
-                print(json.dumps(params, indent=2))
-            elif method == "server.info":
-                print(f"\n✓ Received server info:")
-                print(json.dumps(params, indent=2))
-            elif method == "notify_status_update":
-                print(f"\n✓ Received notification:")
-                print(json.dumps(params, indent=2))
-            else:
-                print(f"\n? Unknown message: {data}")
-        except json.JSONDecodeError:
-            print(f"\n? Invalid JSON message: {message}")
+            self._mark_response(data.get("id"))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            print(f"\n? Invalid JSON message: {message.decode('utf-8', 'replace')}")
         except Exception as e:
             print(f"\n✗ Error handling message: {e}")
     
+    def _on_connected(self, params, data):
+        """Handle the server's connection confirmation."""
+        print(f"\n✓ Server confirmed connection: {params}")
+    
+    def _on_status(self, params, data):
+        """Handle a printer objects status reply."""
+        print(f"\n✓ Received status update:")
+        print(_format_params(params))
+    
+    def _on_server_info(self, params, data):
+        """Handle a server info reply."""
+        print(f"\n✓ Received server info:")
+        print(_format_params(params))
+    
+    def _on_notify(self, params, data):
+        """Handle a status update notification."""
+        print(f"\n✓ Received notification:")
+        print(_format_params(params))
+    
+    def _on_unknown(self, params, data):
+        """Handle a message with an unrecognized method."""
+        print(f"\n? Unknown message: {data}")
+    
+    def _mark_response(self, msg_id):
+        """Record a reply, waking wait_for_responses once all have arrived."""
+        if msg_id is None:
+            return
+        with self._pending_lock:
+            if msg_id in self._pending_ids:
+                self._pending_ids.discard(msg_id)
+                if not self._pending_ids:
+                    self._responses_received.set()
+    
+    def expect_responses(self, msg_ids):
+        """Start tracking replies to the given message ids; call before sending."""
+        with self._pending_lock:
+            self._pending_ids = set(msg_ids)
+            self._responses_received.clear()
+    
+    def wait_for_responses(self, timeout: float) -> bool:
+        """Wait until every expected reply has arrived; False on timeout."""
+        return self._responses_received.wait(timeout)
+    
+    def on_pong(self, ws, data):
+        """Handle keepalive pong."""
+        self.last_pong = time.time()
+    
     def on_error(self, ws, error):
         """Handle WebSocket error."""
         print(f"\n✗ WebSocket error: {error}")
@@ -51,58 +140,86 @@ class WebSocketClient:
         """Handle WebSocket close."""
         print("\n✗ Disconnected from WebSocket server")
         self.connected = False
+        self._closed.set()
     
     def on_open(self, ws):
         """Handle WebSocket open."""
         print("\n✓ Connected to WebSocket server")
         self.connected = True
+        self._opened.set()
     
     def connect(self):
         """Connect to WebSocket server."""
+        self._opened.clear()
+        self._closed.clear()
         self.ws = websocket.WebSocketApp(
             self.url,
             on_open=self.on_open,
             on_message=self.on_message,
             on_error=self.on_error,
-            on_close=self.on_close
+            on_close=self.on_close,
+            on_pong=self.on_pong
         )
         
-        # Run in a separate thread
-        wst = threading.Thread(target=self.ws.run_forever)
-        wst.daemon = True
-        wst.start()
-        
-        # Wait for connection
-        timeout = 5
-        elapsed = 0
-        while not self.connected and elapsed < timeout:
-            time.sleep(0.1)
-            elapsed += 0.1
+        # Run in a separate thread, with ping/pong keepalive. Text frames are
+        # passed on as raw bytes (the JSON parser validates UTF-8 itself).
+        self._thread = threading.Thread(
+            target=self.ws.run_forever,
+            kwargs={
+                "ping_interval": self.PING_INTERVAL,
+                "ping_timeout": self.PING_TIMEOUT,
+                "skip_utf8_validation": True,
+            }
+        )
+        self._thread.daemon = True
+        self._thread.start()
         
-        if not self.connected:
+        # Wait for on_open (or give up after the timeout)
+        if not self._opened.wait(timeout=5):
             raise Exception("Failed to connect to WebSocket server")
     
+    def _encode_message(self, method: str, params: dict = None, msg_id: int = None) -> bytes:
+        """Encode a JSON-RPC message by filling in the pre-encoded envelope."""
+        parts = [self._MESSAGE_PREFIX, _json_dumps(method)]
+        if params:
+            parts += (b',"params":', _json_dumps(params))
+        if msg_id is not None:
+            # Integer ids (the common case) need no JSON encoder call
+            parts.append(b',"id":%d' % msg_id if type(msg_id) is int else b',"id":' + _json_dumps(msg_id))
+        parts.append(b'}')
+        return b"".join(parts)
+    
     def send(self, method: str, params: dict = None, msg_id: int = None):
         """Send a JSON-RPC message."""
         if not self.connected or not self.ws:
             raise Exception("WebSocket not connected")
         
-        message = {
-            "jsonrpc": "2.0",
-            "method": method
-        }
+        self.ws.send(self._encode_message(method, params, msg_id))
+    
+    def send_batch(self, calls: list):
+        """
+        Send several JSON-RPC messages as one batch frame.
         
-        if params:
-            message["params"] = params
-        if msg_id is not None:
-            message["id"] = msg_id
+        Args:
+            calls: List of (method, params, msg_id) tuples
+        """
+        if not self.connected or not self.ws:
+            raise Exception("WebSocket not connected")
         
-        self.ws.send(json.dumps(message))
+        self.ws.send(b"[" + b",".join(
+            self._encode_message(method, params, msg_id) for method, params, msg_id in calls
+        ) + b"]")
     
-    def disconnect(self):
-        """Disconnect from WebSocket server."""
-        if self.ws:
-            self.ws.close()
+    def disconnect(self, timeout: float = 0.5):
+        """Disconnect from WebSocket server and wait for the close to finish."""
+        if self.ws and self.ws.sock and self.ws.sock.connected:
+            # Start the closing handshake; run_forever reads the server's close
+            # frame, tears down and calls on_close
+            self.ws.sock.send_close()
+            if not self._closed.wait(timeout=timeout):
+                # No reply in time: close locally. on_close then only fires once
+                # run_forever's read loop wakes up (up to PING_TIMEOUT later).
+                self.ws.close()
         self.connected = False
 
 
@@ -119,30 +236,27 @@ def test_websocket(base_url: str = "http://localhost:7125"):
         print("\nConnecting to WebSocket server...")
         client.connect()
         
-        # Wait a bit for connection
-        time.sleep(0.5)
-        
-        # Subscribe to printer objects
-        print("\nSubscribing to printer objects...")
-        client.send("printer.objects.subscribe", {
-            "objects": {
-                "temperature_sensor": None,
-                "heater_bed": None,
-                "print_stats": None
-            }
-        }, msg_id=1)
-        
-        # Request server info
-        print("\nRequesting server info...")
-        client.send("server.info", msg_id=2)
+        # Subscribe to printer objects and request server info in one frame
+        print("\nSubscribing to printer objects and requesting server info...")
+        client.expect_responses([1, 2])
+        client.send_batch([
+            ("printer.objects.subscribe", {
+                "objects": {
+                    "temperature_sensor": None,
+                    "heater_bed": None,
+                    "print_stats": None
+                }
+            }, 1),
+            ("server.info", None, 2),
+        ])
         
-        # Wait for responses
-        time.sleep(2)
+        # Wait for both replies (at most 2 seconds)
+        if not client.wait_for_responses(2):
+            print("\n✗ Timed out waiting for responses")
         
         # Disconnect
         print("\nDisconnecting...")
         client.disconnect()
-        time.sleep(0.5)
         
     except Exception as e:
         print(f"\n✗ Error: {e}")
@@ -5,79 +5,181 @@ This module provides functions and classes to test Moonraker Simulator service d
 using Zeroconf (mDNS/Bonjour) on local networks.
 """
 
+from socket import AF_INET, AF_INET6, inet_ntop
+import atexit
+import functools
+import sys
 import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
 import json
 import requests
-from zeroconf import ServiceBrowser, Zeroconf, ServiceListener
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.util.retry import Retry
+from typing import Optional
+from zeroconf import IPVersion, ServiceBrowser, Zeroconf, ServiceListener
+
+# Shared keep-alive session for connection tests. Failed connects, read
+# timeouts and gateway errors are retried by urllib3 with a short backoff.
+PROBE_RETRIES = 2
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=16,
+    max_retries=Retry(total=PROBE_RETRIES, backoff_factor=0.2,
+                      status_forcelist=(502, 503, 504), raise_on_status=False),
+))
+
+# Shared Zeroconf instance: sockets and the record cache are set up once per
+# process and reused by every discovery run (see _get_zeroconf)
+_shared_zc: Optional[Zeroconf] = None
+_shared_zc_lock = threading.Lock()
+
+# Header of each service in the discovery results
+_SERVICE_TEMPLATE = (
+    "\nService {i}:\n"
+    "  Name: {name}\n"
+    "  Type: {type}\n"
+    "  Addresses: {addrs}\n"
+    "  Port: {port}\n"
+    "  Server: {server}"
+)
+
+# Packed address length -> address family for inet_ntop
+_ADDRESS_FAMILIES = {4: AF_INET, 16: AF_INET6}
+
+
+@functools.lru_cache(maxsize=4096)
+def _decode_bytes(value: bytes) -> str:
+    """
+    Convert TXT bytes to a string.
+    
+    Announcements repeat the same short keys and values, so results are
+    cached per process.
+    """
+    # TXT records are almost always ASCII
+    return value.decode('ascii') if value.isascii() else value.decode('utf-8', 'replace')
+
+
+def _get_zeroconf() -> Zeroconf:
+    """Get the process-wide Zeroconf instance, creating it on first use."""
+    global _shared_zc
+    with _shared_zc_lock:
+        if _shared_zc is None:
+            # The simulator registers IPv4 addresses only, so skip IPv6 mDNS traffic
+            _shared_zc = Zeroconf(ip_version=IPVersion.V4Only)
+            atexit.register(_shared_zc.close)
+        return _shared_zc
 
 
 class MoonrakerServiceListener(ServiceListener):
     """Listener for Moonraker service discovery."""
     
-    def __init__(self):
-        self.services = []
-        self.services_by_key = {}  # Track services by (IP, port) to avoid duplicates
+    # Updates are answered from the zeroconf cache, so don't wait long for them
+    UPDATE_INFO_TIMEOUT_MS = 200
+    
+    def __init__(self, expected_services: int = None):
+        """
+        Args:
+            expected_services: Set found_event once this many services are
+                               discovered (None: never set it early)
+        """
+        self.expected_services = expected_services
+        self.found_event = threading.Event()
+        self.services_by_key = {}  # (IP, port) -> service data, one entry per server
+        self.services_by_name = {}  # name -> (IP, port) key, for removal by name
+        self._address_cache = {}  # name -> (raw address bytes, converted addresses)
+        self._fingerprints = {}  # name -> last processed record (see _fingerprint)
         self.lock = threading.Lock()
     
     def _get_service_key(self, address, port):
         """Generate a unique key for a service (IP address + port)."""
-        return f"{address}:{port}"
+        return (address, port)
     
     def _convert_addresses(self, info):
         """Convert addresses from bytes to IP strings."""
+        raw_addresses = tuple(info.addresses)
+        # Updates usually carry the same addresses; reuse the last conversion
+        cached = self._address_cache.get(info.name)
+        if cached is not None and cached[0] == raw_addresses:
+            return list(cached[1])
+        
         addresses = []
-        for addr in info.addresses:
+        for addr in raw_addresses:
             if isinstance(addr, bytes):
-                # IPv4 address is 4 bytes
-                if len(addr) == 4:
-                    addresses.append('.'.join(str(b) for b in addr))
-                elif len(addr) == 16:
-                    # IPv6 address (16 bytes) - convert to hex format
-                    ipv6_parts = [f'{addr[i]:02x}{addr[i+1]:02x}' for i in range(0, 16, 2)]
-                    addresses.append(':'.join(ipv6_parts))
+                # IPv4 (4 bytes) or IPv6 (16 bytes, canonical compressed form)
+                family = _ADDRESS_FAMILIES.get(len(addr))
+                if family is not None:
+                    addresses.append(inet_ntop(family, addr))
                 else:
                     addresses.append(addr.hex())
             else:
                 addresses.append(str(addr))
+        self._address_cache[info.name] = (raw_addresses, tuple(addresses))
         return addresses
     
+    @staticmethod
+    def _fingerprint(info):
+        """Summarize the parts of a service record that we keep."""
+        properties = tuple(sorted(info.properties.items())) if info.properties else ()
+        return (tuple(info.addresses), info.port, properties, info.server)
+    
+    @staticmethod
+    def _decode_properties(props):
+        """Convert TXT properties from bytes to strings."""
+        if not props:
+            return {}
+        # Local bindings and exact type checks (zeroconf hands us plain bytes)
+        # keep per-property lookups out of the comprehension
+        _bytes = bytes
+        decode = _decode_bytes
+        return {
+            (decode(key) if type(key) is _bytes else key):
+                (decode(value) if type(value) is _bytes else value)
+            for key, value in props.items()
+        }
+    
     def add_service(self, zeroconf, service_type, name):
         """Called when a service is discovered."""
         info = zeroconf.get_service_info(service_type, name)
         if info:
-            with self.lock:
-                # Convert addresses first
-                addresses = self._convert_addresses(info)
-                if not addresses:
-                    return  # No valid address
-                
-                # Use first address + port as unique key
-                primary_address = addresses[0]
-                port = info.port
-                service_key = self._get_service_key(primary_address, port)
-                
-                # Check if service already exists (by IP + port)
-                if service_key in self.services_by_key:
-                    # Service already exists, update it silently (no duplicate)
-                    existing_service = self.services_by_key[service_key]
-                    # Update existing service data
-                    self._update_service_data(existing_service, info, service_type, name, addresses)
-                    return
-                
-                # Convert properties from bytes to strings
-                properties = {}
-                if info.properties:
-                    for key, value in info.properties.items():
-                        if isinstance(key, bytes):
-                            key = key.decode('utf-8')
-                        if isinstance(value, bytes):
-                            try:
-                                value = value.decode('utf-8')
-                            except UnicodeDecodeError:
-                                value = value.hex()
-                        properties[key] = value
-                
+            self._add_service_info(info, service_type, name)
+    
+    def _add_service_info(self, info, service_type, name):
+        """Record (or refresh) a service from its resolved info."""
+        # Convert everything before taking the lock; it only guards the indexes
+        fingerprint = self._fingerprint(info)
+        addresses = self._convert_addresses(info)
+        if not addresses:
+            self._fingerprints[name] = fingerprint
+            return  # No valid address
+        
+        # Use first address + port as unique key
+        port = info.port
+        service_key = self._get_service_key(addresses[0], port)
+        properties = self._decode_properties(info.properties)
+        
+        with self.lock:
+            self._fingerprints[name] = fingerprint
+            # Check if service already exists (by IP + port, then by name)
+            previous_key = self.services_by_name.get(name)
+            existing_service = self.services_by_key.get(service_key)
+            if existing_service is None and previous_key is not None:
+                existing_service = self.services_by_key.get(previous_key)
+            elif previous_key is not None and previous_key != service_key:
+                # This name moved onto a key held by another entry; drop its old one
+                previous = self.services_by_key.get(previous_key)
+                if previous is not None and previous["name"] == name:
+                    del self.services_by_key[previous_key]
+            if existing_service is not None:
+                # Service already exists, update it silently (no duplicate)
+                old_name = existing_service["name"]
+                change = self._update_service_data(existing_service, info, service_type, name,
+                                                   addresses, properties)
+                if old_name != name:
+                    self.services_by_name.pop(old_name, None)
+                self.services_by_name[name] = service_key
+            else:
+                change = None
                 service_data = {
                     "name": name,
                     "type": service_type,
@@ -86,40 +188,44 @@ class MoonrakerServiceListener(ServiceListener):
                     "properties": properties,
                     "server": info.server
                 }
-                self.services.append(service_data)
                 self.services_by_key[service_key] = service_data
-                print(f"\n✓ Discovered service: {name}")
-                print(f"  Address: {', '.join(service_data['addresses'])}")
-                print(f"  Port: {service_data['port']}")
-                if service_data['properties']:
-                    print(f"  Properties: {service_data['properties']}")
+                self.services_by_name[name] = service_key
+                if self.expected_services and len(self.services_by_key) >= self.expected_services:
+                    self.found_event.set()
+        
+        # Report outside the lock, so a blocked stdout never stalls other callbacks
+        if existing_service is not None:
+            if change:
+                print(change)
+            return
+        print(f"\n✓ Discovered service: {name}")
+        print(f"  Address: {', '.join(addresses)}")
+        print(f"  Port: {port}")
+        if properties:
+            print(f"  Properties: {properties}")
     
-    def _update_service_data(self, service_data, info, service_type, name, addresses=None):
-        """Update existing service data with new information."""
+    def _update_service_data(self, service_data, info, service_type, name,
+                             addresses=None, properties=None):
+        """
+        Update existing service data with new information.
+        
+        Returns:
+            A message describing an address/port change, or None
+        """
         if addresses is None:
             addresses = self._convert_addresses(info)
+        if properties is None:
+            properties = self._decode_properties(info.properties)
         
         old_address = service_data.get("addresses", [""])[0] if service_data.get("addresses") else ""
         old_port = service_data.get("port")
         new_address = addresses[0] if addresses else ""
         new_port = info.port
         
-        # Convert properties from bytes to strings
-        properties = {}
-        if info.properties:
-            for key, value in info.properties.items():
-                if isinstance(key, bytes):
-                    key = key.decode('utf-8')
-                if isinstance(value, bytes):
-                    try:
-                        value = value.decode('utf-8')
-                    except UnicodeDecodeError:
-                        value = value.hex()
-                properties[key] = value
-        
         # Check if address or port changed (shouldn't happen, but log if it does)
+        change = None
         if old_address != new_address or old_port != new_port:
-            print(f"\n⚠ Service {name} changed: {old_address}:{old_port} -> {new_address}:{new_port}")
+            change = f"\n⚠ Service {name} changed: {old_address}:{old_port} -> {new_address}:{new_port}"
             # Remove old service key and add new one
             old_key = self._get_service_key(old_address, old_port)
             new_key = self._get_service_key(new_address, new_port)
@@ -133,34 +239,129 @@ class MoonrakerServiceListener(ServiceListener):
         service_data["properties"] = properties
         service_data["server"] = info.server
         service_data["name"] = name  # Update name in case it changed
+        return change
     
     def remove_service(self, zeroconf, service_type, name):
         """Called when a service is removed."""
         with self.lock:
-            # Find and remove all services with this name (could be multiple IP:port combinations)
-            services_to_remove = [s for s in self.services if s['name'] == name]
-            for service in services_to_remove:
-                address = service['addresses'][0] if service.get('addresses') else 'unknown'
-                port = service['port']
-                service_key = self._get_service_key(address, port)
-                if service_key in self.services_by_key:
-                    del self.services_by_key[service_key]
-                self.services.remove(service)
-                print(f"\n✗ Service removed: {name} ({address}:{port})")
+            self._address_cache.pop(name, None)
+            self._fingerprints.pop(name, None)
+            service_key = self.services_by_name.pop(name, None)
+            if service_key is None:
+                return
+            # Only drop the entry if it still belongs to this name; another
+            # service may have taken over the key since it was indexed
+            service = self.services_by_key.get(service_key)
+            if service is not None and service["name"] == name:
+                del self.services_by_key[service_key]
+            address, port = service_key
+        print(f"\n✗ Service removed: {name} ({address}:{port})")
     
     def update_service(self, zeroconf, service_type, name):
         """Called when a service is updated."""
-        # Re-add to get updated info
-        self.add_service(zeroconf, service_type, name)
+        info = zeroconf.get_service_info(service_type, name, timeout=self.UPDATE_INFO_TIMEOUT_MS)
+        if not info:
+            return
+        # Updates often repeat the same record; only re-process real changes
+        # (a single dict lookup, so no lock is needed)
+        fingerprint = self._fingerprint(info)
+        if self._fingerprints.get(name) == fingerprint:
+            return
+        
+        # Known service still at the same address and port: refresh it in place
+        # without going through duplicate detection
+        addresses = self._convert_addresses(info)
+        if addresses:
+            service_key = self._get_service_key(addresses[0], info.port)
+            properties = self._decode_properties(info.properties)
+            with self.lock:
+                service = self.services_by_key.get(service_key)
+                if service is not None and service["name"] == name:
+                    self._fingerprints[name] = fingerprint
+                    self._update_service_data(service, info, service_type, name,
+                                              addresses, properties)
+                    return
+        self._add_service_info(info, service_type, name)
     
     def get_services(self):
         """Get list of discovered services."""
-        with self.lock:
-            return self.services.copy()
+        # list(dict.values()) runs as a single C call under the GIL, so this
+        # snapshot doesn't need the lock
+        return list(self.services_by_key.values())
+
+
+def _base_url(service) -> str:
+    """Base URL of a discovered service (first address)."""
+    return f"http://{service['addresses'][0]}:{service['port']}"
 
 
-def test_service_discovery(timeout: int = 5):
-    """Test Zeroconf service discovery on local network."""
+def _timed_out(error: Exception) -> bool:
+    """
+    Whether a failed probe timed out.
+    
+    Once retries are exhausted, requests reports a read timeout as a
+    ConnectionError wrapping MaxRetryError(ReadTimeoutError), not as Timeout.
+    (Connect timeouts already arrive as ConnectTimeout.)
+    """
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.ReadTimeoutError)
+
+
+def _probe_service(base_url: str):
+    """
+    Check that a discovered service answers /server/info.
+    
+    Returns:
+        (connected, output lines), so concurrent probes can be reported in order
+    """
+    lines = []
+    connected = False
+    try:
+        # Use longer timeout for connection test; retries happen in urllib3
+        response = SESSION.get(
+            f"{base_url}/server/info",
+            timeout=(3, 5)  # (connect timeout, read timeout)
+        )
+        if response.status_code == 200:
+            lines.append(f"  ✓ Successfully connected!")
+            info = response.json()
+            if 'result' in info:
+                version = info['result'].get('moonraker_version', 'unknown')
+                state = info['result'].get('klippy_state', 'unknown')
+                lines.append(f"  Moonraker Version: {version}")
+                lines.append(f"  Klippy State: {state}")
+            connected = True
+        else:
+            lines.append(f"  ✗ Connection failed: HTTP {response.status_code}")
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        if _timed_out(e):
+            lines.append(f"  ✗ Connection failed: Timeout after {PROBE_RETRIES + 1} attempts")
+            lines.append(f"    This may indicate:")
+            lines.append(f"    - Server is not responding")
+            lines.append(f"    - Firewall blocking the connection")
+            lines.append(f"    - Network connectivity issues")
+            return connected, lines
+        lines.append(f"  ✗ Connection failed: {e}")
+        lines.append(f"    This may indicate:")
+        lines.append(f"    - Server is not running on this port")
+        lines.append(f"    - Port is blocked by firewall")
+        lines.append(f"    - Network routing issues")
+    except Exception as e:
+        lines.append(f"  ✗ Connection failed: {e}")
+    
+    return connected, lines
+
+
+def test_service_discovery(timeout: int = 5, expected_services: int = None):
+    """
+    Test Zeroconf service discovery on local network.
+    
+    Args:
+        timeout: Maximum time to wait for services, in seconds
+        expected_services: Stop waiting as soon as this many services are found
+    """
     print("\n" + "=" * 50)
     print("Testing Service Discovery (Zeroconf/mDNS)")
     print("=" * 50)
@@ -170,8 +371,8 @@ def test_service_discovery(timeout: int = 5):
     print("\nNote: This uses mDNS/Bonjour for local network discovery.")
     print("      Services on the same LAN should be discoverable automatically.")
     
-    zeroconf = Zeroconf()
-    listener = MoonrakerServiceListener()
+    zeroconf = _get_zeroconf()
+    listener = MoonrakerServiceListener(expected_services)
     
     # Browse for Moonraker services
     service_type = "_moonraker._tcp.local."
@@ -181,7 +382,7 @@ def test_service_discovery(timeout: int = 5):
         # Wait for services to be discovered
         print("\nWaiting for services to be discovered...")
         print("(Services will appear as they are found)")
-        time.sleep(timeout)
+        listener.found_event.wait(timeout)
         
         # Get discovered services
         services = listener.get_services()
@@ -189,77 +390,36 @@ def test_service_discovery(timeout: int = 5):
         if services:
             print(f"\n✓ Found {len(services)} service(s):")
             print("\n" + "-" * 50)
+            # Probe all services at once, so the wait is the slowest probe
+            # rather than the sum of them
+            executor = ThreadPoolExecutor(max_workers=len(services))
+            probes = {
+                service['name']: executor.submit(_probe_service, _base_url(service))
+                for service in services if service['addresses']
+            }
+            executor.shutdown(wait=False)
             for i, service in enumerate(services, 1):
-                print(f"\nService {i}:")
-                print(f"  Name: {service['name']}")
-                print(f"  Type: {service['type']}")
-                print(f"  Addresses: {', '.join(service['addresses'])}")
-                print(f"  Port: {service['port']}")
-                print(f"  Server: {service['server']}")
+                # Build each service's report and write it in one go
+                out = [_SERVICE_TEMPLATE.format(
+                    i=i, name=service['name'], type=service['type'],
+                    addrs=', '.join(service['addresses']), port=service['port'],
+                    server=service['server'],
+                )]
                 if service['properties']:
-                    print(f"  Properties:")
-                    for key, value in service['properties'].items():
-                        if isinstance(value, bytes):
-                            value = value.decode('utf-8')
-                        print(f"    {key}: {value}")
+                    out.append("  Properties:")
+                    out.extend(f"    {key}: {value}" for key, value in service['properties'].items())
                 
-                # Try to connect to the discovered service
-                if service['addresses']:
-                    address = service['addresses'][0]
-                    port = service['port']
-                    base_url = f"http://{address}:{port}"
-                    print(f"\n  Testing connection to {base_url}...")
-                    
-                    # Try connection with retries
-                    max_retries = 3
-                    connected = False
-                    for attempt in range(1, max_retries + 1):
-                        try:
-                            # Use longer timeout for connection test
-                            response = requests.get(
-                                f"{base_url}/server/info",
-                                timeout=(3, 5)  # (connect timeout, read timeout)
-                            )
-                            if response.status_code == 200:
-                                print(f"  ✓ Successfully connected!")
-                                info = response.json()
-                                if 'result' in info:
-                                    version = info['result'].get('moonraker_version', 'unknown')
-                                    state = info['result'].get('klippy_state', 'unknown')
-                                    print(f"  Moonraker Version: {version}")
-                                    print(f"  Klippy State: {state}")
-                                connected = True
-                                break
-                            else:
-                                print(f"  ✗ Connection failed: HTTP {response.status_code}")
-                                if attempt < max_retries:
-                                    print(f"    Retrying... ({attempt}/{max_retries})")
-                        except requests.exceptions.Timeout as e:
-                            if attempt < max_retries:
-                                print(f"  ⚠ Connection timeout (attempt {attempt}/{max_retries}), retrying...")
-                            else:
-                                print(f"  ✗ Connection failed: Timeout after {max_retries} attempts")
-                                print(f"    This may indicate:")
-                                print(f"    - Server is not responding")
-                                print(f"    - Firewall blocking the connection")
-                                print(f"    - Network connectivity issues")
-                        except requests.exceptions.ConnectionError as e:
-                            if attempt < max_retries:
-                                print(f"  ⚠ Connection error (attempt {attempt}/{max_retries}), retrying...")
-                            else:
-                                print(f"  ✗ Connection failed: {e}")
-                                print(f"    This may indicate:")
-                                print(f"    - Server is not running on this port")
-                                print(f"    - Port is blocked by firewall")
-                                print(f"    - Network routing issues")
-                        except Exception as e:
-                            print(f"  ✗ Connection failed: {e}")
-                            break
-                    
+                # Connection test results, in discovery order
+                future = probes.get(service['name'])
+                if future is not None:
+                    out.append(f"\n  Testing connection to {_base_url(service)}...")
+                    connected, lines = future.result()
+                    out.extend(lines)
                     if not connected:
-                        print(f"  💡 Tip: Verify the server is running with:")
-                        print(f"     python -m moonraker_simulator --port {port}")
-                print("-" * 50)
+                        out.append(f"  💡 Tip: Verify the server is running with:")
+                        out.append(f"     python -m moonraker_simulator --port {service['port']}")
+                out.append("-" * 50 + "\n")
+                sys.stdout.write("\n".join(out))
         else:
             print("\n✗ No Moonraker services found")
             print("  Make sure:")
@@ -270,8 +430,8 @@ def test_service_discovery(timeout: int = 5):
     except KeyboardInterrupt:
         print("\n\nSearch interrupted by user")
     finally:
+        # The shared Zeroconf instance stays open for later runs
         browser.cancel()
-        zeroconf.close()
         print("\nService discovery stopped")
 
 
@@ -281,9 +441,11 @@ def main():
     
     parser = argparse.ArgumentParser(description="Test Moonraker Simulator Service Discovery")
     parser.add_argument("--timeout", type=int, default=5, help="Service discovery timeout in seconds")
+    parser.add_argument("--expected", type=int, default=None,
+                        help="Stop searching once this many services are found")
     
     args = parser.parse_args()
-    test_service_discovery(args.timeout)
+    test_service_discovery(args.timeout, args.expected)
 
 
 if __name__ == "__main__":
@@ -3,37 +3,42 @@
 Test script to diagnose Chinese font display issues in DearPyGui.
 """
 
+import functools
 import os
 import platform
 import dearpygui.dearpygui as dpg
 
+# Chinese fonts to look for, in order of preference
+_FONT_CANDIDATES = (
+    r"C:\Windows\Fonts\msyh.ttc",
+    r"C:\Windows\Fonts\msyhbd.ttc",
+    r"C:\Windows\Fonts\simhei.ttf",
+    r"C:\Windows\Fonts\simsun.ttc",
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _existing_fonts():
+    """Candidate fonts that exist on this system (checked once per process)."""
+    return frozenset(path for path in _FONT_CANDIDATES if os.path.exists(path))
+
+
 def test_chinese_font():
     """Test Chinese font loading."""
     system = platform.system()
     print(f"Operating System: {system}")
     
     # Find Chinese font
-    font_path = None
-    if system == "Windows":
-        font_paths = [
-            r"C:\Windows\Fonts\msyh.ttc",
-            r"C:\Windows\Fonts\msyhbd.ttc",
-            r"C:\Windows\Fonts\simhei.ttf",
-            r"C:\Windows\Fonts\simsun.ttc",
-        ]
-    else:
+    if system != "Windows":
         print("This test is for Windows. Please check font paths for your OS.")
         return
     
-    for path in font_paths:
-        if os.path.exists(path):
-            font_path = path
-            print(f"Found font: {font_path}")
-            break
-    
+    existing_fonts = _existing_fonts()
+    font_path = next((path for path in _FONT_CANDIDATES if path in existing_fonts), None)
     if not font_path:
         print("No Chinese font found!")
         return
+    print(f"Found font: {font_path}")
     
     # Create GUI
     dpg.create_context()
@@ -51,7 +56,7 @@ def test_chinese_font():
             
             loaded_font = None
             for test_path in font_paths_priority:
-                if os.path.exists(test_path):
+                if test_path in existing_fonts:
                     try:
                         font = dpg.add_font(test_path, 20)
                         dpg.bind_font(font)
@@ -3,33 +3,41 @@
 Simple test to verify Chinese font display in dearpygui.
 """
 
+import functools
 import os
 import dearpygui.dearpygui as dpg
 
+# Fonts to try, in order
+_FONT_CANDIDATES = (
+    r"C:\Windows\Fonts\simhei.ttf",  # SimHei (黑体)
+    r"C:\Windows\Fonts\simsun.ttc",   # SimSun (宋体)
+    r"C:\Windows\Fonts\msyh.ttc",     # Microsoft YaHei
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _existing_fonts():
+    """Candidate fonts that exist on this system (checked once per process)."""
+    return tuple(path for path in _FONT_CANDIDATES if os.path.exists(path))
+
+
 def test_simple():
     dpg.create_context()
     
-    # Try different fonts
-    fonts_to_try = [
-        r"C:\Windows\Fonts\simhei.ttf",  # SimHei (黑体)
-        r"C:\Windows\Fonts\simsun.ttc",   # SimSun (宋体)
-        r"C:\Windows\Fonts\msyh.ttc",     # Microsoft YaHei
-    ]
-    
     font = None
     font_path = None
     
     with dpg.font_registry():
-        for path in fonts_to_try:
-            if os.path.exists(path):
-                try:
-                    font = dpg.add_font(path, 20)
-                    font_path = path
-                    print(f"Loaded font: {path}")
-                    break
-                except Exception as e:
-                    print(f"Failed to load {path}: {e}")
-                    continue
+        # Try the installed fonts in order
+        for path in _existing_fonts():
+            try:
+                font = dpg.add_font(path, 20)
+                font_path = path
+                print(f"Loaded font: {path}")
+                break
+            except Exception as e:
+                print(f"Failed to load {path}: {e}")
+                continue
     
     if font is None:
         print("No font loaded!")